@@ -18,4 +18,4 @@ CREATE TABLE IF NOT EXISTS robot_capabilities (
 CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
 CREATE INDEX IF NOT EXISTS idx_tasks_robot_id ON tasks(robot_id);
 CREATE INDEX IF NOT EXISTS idx_robot_capabilities_robot_id ON robot_capabilities(robot_id);
-
+CREATE INDEX IF NOT EXISTS idx_robot_capabilities_capability ON robot_capabilities(capability);
@@ -2,17 +2,39 @@
 # Purpose: Implements AI-driven task delegation for MRTODP using TensorFlow to predict task
 # suitability for heterogeneous robots. Interfaces with backend/cpp/task_manager/orchestrator.cpp
 # via gRPC for task delegation requests and queries robot capabilities from SQLite database.
-# Delegates tasks to backend/python/ros_bridge/ via ROS topics. Includes robust error handling
+# Delegates tasks to backend/python/ros_bridge/ via ROS 2 topics. Includes robust error handling
 # for model failures, unavailable robots, and database issues, ensuring reliable operation.
 
+import atexit
+import bisect
+import contextlib
+import functools
+import itertools
 import os
+import queue
+import shutil
 import sqlite3
-from typing import Dict, List, Optional
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
 import tensorflow as tf
 import numpy as np
 import grpc
-import rospy
-from std_msgs.msg import String
+try:
+    import rclpy
+    from rclpy.qos import QoSProfile, ReliabilityPolicy, HistoryPolicy
+    from std_msgs.msg import String
+    ROS_AVAILABLE = True
+except ImportError:
+    ROS_AVAILABLE = False
+try:
+    # Typed task message from backend/ros/mrtodp_interfaces, used when typed_ros_msgs is set
+    from mrtodp_interfaces.msg import Task as TaskMsg
+except ImportError:
+    TaskMsg = None
 import json
 import logging
 
@@ -25,33 +47,183 @@ except ImportError:
     orchestrator_pb2 = None
     orchestrator_pb2_grpc = None
 
-# Configure logging for debugging and error tracking
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Module logger; handlers and levels are left to the application (see __main__ below)
 logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Task type vocabulary, in model input order, shared by every delegator
+TASK_TYPES = ('heavy_lifting', 'delicate_task', 'navigation')
+_TASK_IDX = {t: i for i, t in enumerate(TASK_TYPES)}
+
+# Write-behind buffer for task inserts: flushed as soon as this many rows are pending,
+# and otherwise by a background thread TASK_FLUSH_INTERVAL seconds after the first row arrives
+TASK_FLUSH_BATCH_SIZE = 32
+TASK_FLUSH_INTERVAL = 0.05
+
+# Read connections opened up front and shared by all threads, and how long in seconds a
+# read waits for one to be returned
+READER_POOL_SIZE = 4
+READER_TIMEOUT = 5.0
+
+# Keepalive pings detect dead connections instead of stalling on them
+GRPC_CHANNEL_OPTIONS = (
+    ('grpc.keepalive_time_ms', 10000),
+    ('grpc.keepalive_timeout_ms', 5000),
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.max_send_message_length', 16 << 20),
+    ('grpc.max_receive_message_length', 16 << 20),
+    ('grpc.so_reuseport', 1),
+)
+# Precompute the model's answer for every task type when task types x robots is this small
+SPECIALIZE_MAX_ENTRIES = 64
+
+# Deadline in seconds for DelegateTask calls
+GRPC_TIMEOUT = 2.0
+# Maximum concurrent DelegateTask calls issued by delegate_tasks
+GRPC_MAX_IN_FLIGHT = 16
+
+# Delegators still open at interpreter exit; weak so that registering does not keep them alive
+_open_delegators: "weakref.WeakSet[TaskDelegator]" = weakref.WeakSet()
+
+@atexit.register
+def _close_open_delegators() -> None:
+    """Flush and close any delegator that was not closed explicitly."""
+    for delegator in list(_open_delegators):
+        delegator.close()
+
+def _flush_loop(delegator_ref: "weakref.ref[TaskDelegator]", pending: threading.Event,
+                stop: threading.Event) -> None:
+    """Flush a delegator's task rows TASK_FLUSH_INTERVAL after they arrive, until stopped or collected.
+
+    Sleeps on ``pending`` while the buffer is empty, so an idle delegator never wakes up.
+    """
+    while True:
+        pending.wait()
+        if stop.wait(TASK_FLUSH_INTERVAL):
+            return
+        pending.clear()
+        delegator = delegator_ref()
+        if delegator is None:
+            return
+        try:
+            delegator._flush_tasks()
+        except RuntimeError:
+            # Already logged; the rows are back in the buffer and retried on the next pass
+            pass
+        del delegator
+
+@functools.lru_cache(maxsize=None)
+def _get_grpc_channel(endpoint: str) -> grpc.Channel:
+    """Return a process-wide channel for the endpoint, connecting eagerly in the background."""
+    channel = grpc.insecure_channel(endpoint, options=GRPC_CHANNEL_OPTIONS)
+
+    def _on_state_change(state: grpc.ChannelConnectivity) -> None:
+        if state == grpc.ChannelConnectivity.READY:
+            logger.info(f"gRPC channel to {endpoint} is ready")
+
+    channel.subscribe(_on_state_change, try_to_connect=True)
+    return channel
+
+def robot_roster_path(model_path: str) -> str:
+    """Path of the JSON list of robot IDs, in model output order, stored next to a model."""
+    return f"{model_path}.robots.json"
+
+def convert_to_tflite(model_path: str, output_path: str, int8: bool = False) -> None:
+    """Convert a Keras delegation model to a quantized TFLite model (FP16, or full int8)."""
+    try:
+        model = tf.keras.models.load_model(model_path)
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if int8:
+            # The model's input domain is the task type one-hots, so they are a complete
+            # representative dataset for calibration
+            onehots = np.eye(len(TASK_TYPES), dtype=np.float32)
+            converter.representative_dataset = lambda: ([row[None, :]] for row in onehots)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+        else:
+            converter.target_spec.supported_types = [tf.float16]
+        with open(output_path, 'wb') as f:
+            f.write(converter.convert())
+        # Carry the robot roster along so the converted model maps outputs the same way
+        if os.path.exists(robot_roster_path(model_path)):
+            shutil.copyfile(robot_roster_path(model_path), robot_roster_path(output_path))
+        logger.info(f"Wrote {'int8' if int8 else 'FP16'} TFLite model to {output_path}")
+    except Exception as e:
+        logger.error(f"TFLite conversion failed: {e}")
+        raise RuntimeError(f"TFLite conversion failed: {e}")
 
 class TaskDelegator:
     """AI-driven task delegator for MRTODP."""
     
-    def __init__(self, model_path: str, db_path: str, grpc_endpoint: str, ros_topic: str):
-        """Initialize the delegator with TensorFlow model, SQLite database, gRPC, and ROS."""
+    def __init__(self, model_path: str, db_path: str, grpc_endpoint: str, ros_topic: str,
+                 typed_ros_msgs: bool = False):
+        """Initialize the delegator with TensorFlow model, SQLite database, gRPC, and ROS.
+
+        Tasks are published as std_msgs/String JSON unless typed_ros_msgs is set, in which case
+        they are published as mrtodp_interfaces/Task messages.
+        """
         # Initialize SQLite database connection first (required for capabilities)
+        # Writes go through one autocommit connection with explicit transactions; reads use
+        # a pool of connections so they run in parallel under WAL
+        self.model_path = model_path
+        self.db_path = db_path
+        self.grpc_endpoint = grpc_endpoint
+        self.ros_topic = ros_topic
+        self.typed_ros_msgs = typed_ros_msgs
+        self._readers: Optional["queue.Queue[sqlite3.Connection]"] = None
         try:
-            self.db = sqlite3.connect(db_path, check_same_thread=False)
-            self.db.row_factory = sqlite3.Row
+            self.db = self._connect(isolation_level=None)
             logger.info(f"Connected to SQLite database at {db_path}")
             # Initialize database schema if needed
             self._init_database()
+            # Each connection to :memory: is a separate database, so reads use the writer there
+            if db_path != ":memory:":
+                self._readers = queue.Queue()
+                for _ in range(READER_POOL_SIZE):
+                    self._readers.put(self._connect())
         except sqlite3.Error as e:
             logger.error(f"Failed to connect to SQLite database: {e}")
             raise RuntimeError(f"Database connection failed: {e}")
 
+        # Pending task rows, flushed in batches by _flush_tasks
+        self._pending_tasks: List[Tuple[str, str, str]] = []
+        self._task_flush_lock = threading.Lock()
+        self._closed = False
+        self._tasks_pending = threading.Event()
+        self._flush_stop = threading.Event()
+        self._flush_thread = threading.Thread(
+            target=_flush_loop, args=(weakref.ref(self), self._tasks_pending, self._flush_stop),
+            name="mrtodp-task-flush", daemon=True
+        )
+        self._flush_thread.start()
+        _open_delegators.add(self)
+
+        # Task type vocabulary and precomputed one-hot rows for model input
+        self._task_types = TASK_TYPES
+        self._task_idx = _TASK_IDX
+        self._onehots = np.eye(len(TASK_TYPES), dtype=np.float32)
+        # Batch sizes the model is compiled for; inputs are padded up to the next one
+        self._batch_buckets = self._bucket_sizes(self._max_predict_rows())
+
         # Initialize TensorFlow model (optional - can work without it)
         self.model = None
+        self._model_robot_ids: Optional[Tuple[str, ...]] = None
         if model_path and os.path.exists(model_path):
             try:
-                self.model = tf.keras.models.load_model(model_path)
+                if model_path.endswith('.tflite'):
+                    # Quantized model produced by convert_to_tflite
+                    self.model = tf.lite.Interpreter(model_path=model_path, num_threads=os.cpu_count())
+                    self.model.allocate_tensors()
+                    self._predict_fn = self._tflite_predict_fn()
+                else:
+                    self.model = tf.keras.models.load_model(model_path)
+                    self._predict_fn = self._compile_predict_fn()
+                self._model_robot_ids = self._load_robot_roster(model_path)
                 logger.info(f"Loaded TensorFlow model from {model_path}")
             except Exception as e:
+                self.model = None
                 logger.warning(f"Failed to load TensorFlow model: {e}. Continuing without model.")
         else:
             logger.warning("No model path provided or model file not found. Using rule-based delegation.")
@@ -61,26 +233,191 @@ class TaskDelegator:
         self.grpc_stub = None
         if grpc_endpoint and orchestrator_pb2_grpc:
             try:
-                self.grpc_channel = grpc.insecure_channel(grpc_endpoint)
+                self.grpc_channel = _get_grpc_channel(grpc_endpoint)
                 self.grpc_stub = orchestrator_pb2_grpc.OrchestratorStub(self.grpc_channel)
                 logger.info(f"Connected to gRPC orchestrator at {grpc_endpoint}")
             except Exception as e:
                 logger.warning(f"Failed to connect to gRPC orchestrator: {e}. Continuing without gRPC.")
 
         # Initialize ROS publisher (optional)
+        self.ros_node = None
         self.ros_pub = None
-        if ros_topic:
+        if ros_topic and typed_ros_msgs and TaskMsg is None:
+            logger.warning("mrtodp_interfaces not available for typed task messages. Continuing without ROS.")
+        elif ros_topic and ROS_AVAILABLE:
             try:
-                if not rospy.get_node_uri():
-                    rospy.init_node('task_delegator', anonymous=True)
-                self.ros_pub = rospy.Publisher(ros_topic, String, queue_size=10)
-                logger.info(f"Initialized ROS publisher on topic {ros_topic}")
+                # The message type on the topic is the caller's choice, not a side effect of
+                # which ROS packages happen to be sourced
+                msg_type = TaskMsg if typed_ros_msgs else String
+                if not rclpy.ok():
+                    rclpy.init()
+                self.ros_node = rclpy.create_node('task_delegator')
+                qos = QoSProfile(
+                    reliability=ReliabilityPolicy.RELIABLE,
+                    history=HistoryPolicy.KEEP_LAST,
+                    depth=10
+                )
+                self.ros_pub = self.ros_node.create_publisher(msg_type, ros_topic, qos)
+                # Reused for every publish; the publisher copies the fields out at publish time
+                self._ros_msg = msg_type()
+                self._ros_msg_lock = threading.Lock()
+                logger.info(f"Initialized ROS 2 publisher on topic {ros_topic}")
             except Exception as e:
-                logger.warning(f"Failed to initialize ROS node: {e}. Continuing without ROS.")
+                logger.warning(f"Failed to initialize ROS 2 node: {e}. Continuing without ROS.")
+        elif ros_topic:
+            logger.warning("ROS 2 not available. Continuing without ROS.")
+        # JSON payloads for the std_msgs/String fallback, keyed by (robot_id, task_type)
+        self._ros_payloads: Dict[Tuple[str, str], str] = {}
+
+        # Prediction cache (task_type -> (robot_id, capability version it was computed for))
+        self._pred_cache: Dict[str, Tuple[str, int]] = {}
+        self._cap_version = 0
 
         # Robot capabilities cache (robot_id -> {capability: strength})
         self.capabilities = self._load_capabilities()
 
+    def _specialize(self) -> None:
+        """Replace model inference with a lookup table when the input domain is small.
+
+        The model only ever sees one one-hot row per task type, so for a small roster it is
+        evaluated on all of them once and predictions become a dict lookup.
+        """
+        self._spec_table: Optional[Dict[str, str]] = None
+        if not self.model or len(self._task_types) * len(self._robot_ids) > SPECIALIZE_MAX_ENTRIES:
+            return
+        try:
+            best = self._predict(self._onehots)
+            self._spec_table = {t: self._robot_for_index(int(i)) for t, i in zip(self._task_types, best)}
+            logger.info(f"Specialized model to lookup table: {self._spec_table}")
+        except Exception as e:
+            logger.warning(f"Model specialization failed: {e}. Using model inference.")
+
+    def _load_robot_roster(self, model_path: str) -> Optional[Tuple[str, ...]]:
+        """Load the robot ID list saved alongside a model, if any."""
+        path = robot_roster_path(model_path)
+        if not os.path.exists(path):
+            logger.warning(f"No robot roster at {path}; mapping model outputs to sorted robot IDs")
+            return None
+        with open(path) as f:
+            roster = json.load(f)
+        if not isinstance(roster, list) or not all(isinstance(r, str) for r in roster):
+            raise ValueError(f"Robot roster {path} must be a JSON list of robot IDs")
+        return tuple(roster)
+
+    def _max_predict_rows(self) -> int:
+        """Largest number of rows passed to the model in one call."""
+        return len(TASK_TYPES)
+
+    @staticmethod
+    def _bucket_sizes(max_rows: int) -> Tuple[int, ...]:
+        """Powers of two below max_rows, then max_rows itself."""
+        sizes = [1 << i for i in range(max_rows.bit_length()) if 1 << i < max_rows]
+        return tuple(sizes + [max_rows])
+
+    def _predict(self, x: np.ndarray) -> np.ndarray:
+        """Return the best robot index per row of x, padding x to a precompiled batch size.
+
+        XLA compiles one executable per input shape, so padding keeps compilation off the
+        request path. Inputs larger than the biggest bucket are split across calls.
+        """
+        n = len(x)
+        largest = self._batch_buckets[-1]
+        if n > largest:
+            return np.concatenate([self._predict(x[i:i + largest]) for i in range(0, n, largest)])
+        size = self._batch_buckets[bisect.bisect_left(self._batch_buckets, n)]
+        if size != n:
+            x = np.concatenate([x, np.zeros((size - n, x.shape[1]), dtype=x.dtype)])
+        return np.asarray(self._predict_fn(x))[:n]
+
+    def _compile_predict_fn(self):
+        """Compile the forward pass and argmax with XLA for each (bucket size, 3) input shape.
+
+        The compiled function returns the best robot index per input row, so only a small
+        int32 vector crosses back to the host.
+        """
+        def forward(x):
+            return tf.argmax(self.model(x, training=False), axis=1, output_type=tf.int32)
+
+        try:
+            predict_fn = tf.function(
+                forward,
+                jit_compile=True,
+                input_signature=[tf.TensorSpec([None, 3], tf.float32)]
+            )
+            # Force tracing and XLA compilation of every padded batch size now rather than
+            # on the first request of each size
+            for size in self._batch_buckets:
+                predict_fn(tf.zeros((size, 3), tf.float32))
+            logger.info(f"Compiled TensorFlow model with XLA for batch sizes {self._batch_buckets}")
+            return predict_fn
+        except Exception as e:
+            logger.warning(f"XLA compilation failed: {e}. Falling back to eager model calls.")
+            return forward
+
+    def _tflite_predict_fn(self):
+        """Build a forward pass over the TFLite interpreter, resizing the input per batch size.
+
+        Returns the best robot index per input row, matching _compile_predict_fn.
+        """
+        interp = self.model
+        lock = threading.Lock()
+        input_detail = interp.get_input_details()[0]
+        output_index = interp.get_output_details()[0]['index']
+        input_index = input_detail['index']
+        input_dtype = input_detail['dtype']
+        scale, zero_point = input_detail['quantization']
+
+        def predict(x):
+            x = np.asarray(x, dtype=np.float32)
+            if input_dtype != np.float32:
+                # Full-integer model: quantize the one-hot input
+                x = np.round(x / scale + zero_point).astype(input_dtype)
+            with lock:
+                if tuple(interp.get_input_details()[0]['shape']) != x.shape:
+                    interp.resize_tensor_input(input_index, x.shape)
+                    interp.allocate_tensors()
+                interp.set_tensor(input_index, x)
+                interp.invoke()
+                return np.argmax(interp.get_tensor(output_index), axis=1)
+
+        return predict
+
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        """Open a connection to the task database with the performance PRAGMAs applied."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, **kwargs)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers proceed while the delegator writes; the rest trade durability
+        # of the last transaction on power loss for fewer fsyncs and a larger page cache
+        conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=268435456;
+            PRAGMA cache_size=-65536;
+        """)
+        return conn
+
+    @contextlib.contextmanager
+    def _reader(self):
+        """Check out a pooled read connection for the duration of the block."""
+        if self._closed:
+            raise RuntimeError("Task delegator is closed")
+        if self._readers is None:
+            yield self.db
+            return
+        try:
+            conn = self._readers.get(timeout=READER_TIMEOUT)
+        except queue.Empty:
+            raise RuntimeError("Timed out waiting for a database read connection")
+        try:
+            yield conn
+        finally:
+            # Connections checked out across close() are closed on return instead of pooled
+            if self._closed:
+                conn.close()
+            else:
+                self._readers.put(conn)
+
     def _init_database(self):
         """Initialize database schema if tables don't exist."""
         cursor = self.db.cursor()
@@ -114,21 +451,55 @@ class TaskDelegator:
                 "INSERT OR IGNORE INTO robot_capabilities (robot_id, capability, strength) VALUES (?, ?, ?)",
                 default_caps
             )
+        indexes = {
+            "idx_tasks_robot_id": "tasks(robot_id)",
+            "idx_tasks_status": "tasks(status)",
+            "idx_robot_capabilities_capability": "robot_capabilities(capability)",
+        }
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        missing = indexes.keys() - {row[0] for row in cursor}
+        for name in missing:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {indexes[name]}")
         self.db.commit()
+        # Gather planner statistics once, when the indexes are new; ANALYZE scans every
+        # table and index, so it is not repeated on each start
+        if missing:
+            cursor.execute("ANALYZE")
 
     def _load_capabilities(self) -> Dict[str, Dict[str, int]]:
         """Query robot capabilities from SQLite database."""
         try:
-            cursor = self.db.cursor()
-            cursor.execute("SELECT robot_id, capability, strength FROM robot_capabilities")
-            capabilities = {}
-            for row in cursor.fetchall():
-                robot_id = row['robot_id']
-                if robot_id not in capabilities:
-                    capabilities[robot_id] = {}
-                capabilities[robot_id][row['capability']] = row['strength']
+            # Plain tuple rows on a dedicated cursor, streamed in robot order so each robot's
+            # capabilities arrive as one contiguous group
+            with self._reader() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(
+                    "SELECT robot_id, capability, strength FROM robot_capabilities ORDER BY robot_id"
+                )
+                capabilities = {}
+                best_by_cap: Dict[str, str] = {}
+                best_strength: Dict[str, int] = {}
+                for robot_id, rows in itertools.groupby(cursor, key=itemgetter(0)):
+                    caps = capabilities[robot_id] = {}
+                    for _, capability, strength in rows:
+                        caps[capability] = strength
+                        # Inverted index: strongest robot per capability
+                        if strength > best_strength.get(capability, 0):
+                            best_strength[capability] = strength
+                            best_by_cap[capability] = robot_id
             if not capabilities:
                 logger.warning("No robot capabilities found in database")
+            self._best_by_cap = best_by_cap
+            # Model output axis -> robot ID: the roster saved with the model if there is one,
+            # otherwise the sorted robot IDs (a stable order, unlike table scan order)
+            self._robot_ids: Tuple[str, ...] = self._model_robot_ids or tuple(sorted(capabilities))
+            missing = [r for r in self._robot_ids if r not in capabilities]
+            if self.model and missing:
+                logger.warning(f"Model robot roster includes robots without capabilities: {missing}")
+            self._specialize()
+            # Invalidate cached predictions made against the previous capabilities
+            self._cap_version += 1
             return capabilities
         except sqlite3.Error as e:
             logger.error(f"Failed to load capabilities: {e}")
@@ -136,36 +507,55 @@ class TaskDelegator:
 
     def predict_task_suitability(self, task_type: str) -> Optional[str]:
         """Predict the best robot for a task using TensorFlow model or rule-based approach."""
+        cached = self._pred_cache.get(task_type)
+        if cached is not None and cached[1] == self._cap_version:
+            return cached[0]
         try:
-            # If model is available, use it
-            if self.model:
-                task_types = ['heavy_lifting', 'delicate_task', 'navigation']
-                if task_type not in task_types:
-                    raise ValueError(f"Invalid task type: {task_type}")
-                input_data = np.zeros(len(task_types))
-                input_data[task_types.index(task_type)] = 1.0
-                input_data = input_data.reshape(1, -1)
-
-                predictions = self.model.predict(input_data, verbose=0)
-                robot_ids = list(self.capabilities.keys())
-                if not robot_ids:
-                    raise RuntimeError("No robots available for prediction")
-                best_robot_idx = np.argmax(predictions[0])
-                if best_robot_idx >= len(robot_ids):
-                    raise RuntimeError("Invalid robot index predicted")
-                return robot_ids[best_robot_idx]
-            else:
-                # Rule-based fallback: find robot with highest capability for task type
-                best_robot = None
-                best_score = 0
-                for robot_id, caps in self.capabilities.items():
-                    if task_type in caps and caps[task_type] > best_score:
-                        best_score = caps[task_type]
-                        best_robot = robot_id
-                return best_robot
+            robot_id = self._predict_uncached(task_type)
         except Exception as e:
             logger.error(f"Task suitability prediction failed: {e}")
             return None
+        if robot_id is not None:
+            self._pred_cache[task_type] = (robot_id, self._cap_version)
+        return robot_id
+
+    def _predict_uncached(self, task_type: str) -> Optional[str]:
+        """Run the model or rule-based selection for a task type, bypassing the cache."""
+        # Model specialized to a lookup table for small rosters
+        if self._spec_table is not None:
+            robot_id = self._spec_table.get(task_type)
+            if robot_id is None:
+                raise ValueError(f"Invalid task type: {task_type}")
+            return robot_id
+        # If model is available, use it
+        if self.model:
+            idx = self._task_idx.get(task_type)
+            if idx is None:
+                raise ValueError(f"Invalid task type: {task_type}")
+            input_data = self._onehots[idx:idx + 1]
+
+            best_robot_idx = int(self._predict(input_data)[0])
+            return self._robot_for_index(best_robot_idx)
+        else:
+            # Rule-based fallback: robot with highest capability for task type
+            return self._best_by_cap.get(task_type)
+
+    def _ros_payload(self, robot_id: str, task_type: str) -> str:
+        """Return the JSON task payload, encoding each (robot, task type) pair only once."""
+        key = (robot_id, task_type)
+        payload = self._ros_payloads.get(key)
+        if payload is None:
+            # Both values are validated against the capability table, so the cache stays small
+            payload = self._ros_payloads[key] = json.dumps({"robot_id": robot_id, "task_type": task_type})
+        return payload
+
+    def _robot_for_index(self, best_robot_idx: int) -> str:
+        """Map a model output index back to a robot ID."""
+        if not self._robot_ids:
+            raise RuntimeError("No robots available for prediction")
+        if best_robot_idx >= len(self._robot_ids):
+            raise RuntimeError("Invalid robot index predicted")
+        return self._robot_ids[best_robot_idx]
 
     def delegate_task(self, task_type: str) -> Dict[str, str]:
         """Delegate a task to the best robot via gRPC and ROS."""
@@ -176,64 +566,330 @@ class TaskDelegator:
 
             # Predict best robot
             robot_id = self.predict_task_suitability(task_type)
-            if not robot_id:
-                raise RuntimeError(f"No suitable robot found for task {task_type}")
+            self._verify_assignment(task_type, robot_id)
 
-            # Verify robot capabilities
-            if robot_id not in self.capabilities:
-                raise RuntimeError(f"Robot {robot_id} not found in capabilities")
-            if task_type not in self.capabilities[robot_id]:
-                raise RuntimeError(f"Robot {robot_id} lacks capability for {task_type}")
+            # Send task to orchestrator via gRPC (if available); the call runs in the
+            # background while the task is published and staged, and is resolved below
+            grpc_future = self._send_to_orchestrator(task_type, robot_id)
+            self._publish_task(task_type, robot_id)
 
-            # Send task to orchestrator via gRPC (if available)
-            if self.grpc_stub and orchestrator_pb2:
-                try:
-                    request = orchestrator_pb2.TaskRequest(task_type=task_type, robot_id=robot_id)
-                    response = self.grpc_stub.DelegateTask(request)
-                    if not response.success:
-                        raise RuntimeError(f"Orchestrator rejected task: {response.message}")
-                except Exception as e:
-                    logger.warning(f"gRPC task delegation failed: {e}. Continuing without gRPC.")
-
-            # Publish task to ROS topic (if available)
-            if self.ros_pub:
-                task_data = {"robot_id": robot_id, "task_type": task_type}
+            # Stage task for the next batched database write
+            with self._task_flush_lock:
+                if not self._pending_tasks:
+                    self._tasks_pending.set()
+                self._pending_tasks.append((task_type, robot_id, "assigned"))
+                flush = len(self._pending_tasks) >= TASK_FLUSH_BATCH_SIZE
+            if flush:
                 try:
-                    self.ros_pub.publish(json.dumps(task_data))
-                    rospy.loginfo(f"Published task {task_type} to robot {robot_id}")
-                except Exception as e:
-                    logger.warning(f"ROS publishing failed: {e}")
+                    self._flush_tasks()
+                except RuntimeError:
+                    # Already logged; the row stays buffered and the flusher retries it
+                    pass
+
+            self._check_orchestrator_response(grpc_future)
+            return {"status": "success", "robot_id": robot_id, "task_type": task_type}
+        except Exception as e:
+            logger.error(f"Task delegation failed: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def delegate_tasks(self, task_types: List[str]) -> List[Dict[str, str]]:
+        """Delegate several tasks with one model call, concurrent gRPC calls and one database write.
 
-            # Store task in database
+        Returns one result per task type, in order, shaped like delegate_task's result. As with
+        delegate_task, a failed write leaves the rows buffered for the background flusher.
+        """
+        robot_ids = self.predict_tasks_suitability(task_types)
+        results: List[Dict[str, str]] = []
+        grpc_futures = []
+        rows: List[Tuple[str, str, str]] = []
+        in_flight = threading.BoundedSemaphore(GRPC_MAX_IN_FLIGHT)
+        for task_type, robot_id in zip(task_types, robot_ids):
             try:
-                cursor = self.db.cursor()
-                cursor.execute(
-                    "INSERT INTO tasks (task_type, robot_id, status) VALUES (?, ?, ?)",
-                    (task_type, robot_id, "assigned")
-                )
-                self.db.commit()
+                if not task_type:
+                    raise ValueError("Task type cannot be empty")
+                self._verify_assignment(task_type, robot_id)
+                in_flight.acquire()
+                grpc_future = self._send_to_orchestrator(task_type, robot_id)
+                if grpc_future is None:
+                    in_flight.release()
+                else:
+                    grpc_future.add_done_callback(lambda _: in_flight.release())
+                    grpc_futures.append(grpc_future)
+                self._publish_task(task_type, robot_id)
+                rows.append((task_type, robot_id, "assigned"))
+                results.append({"status": "success", "robot_id": robot_id, "task_type": task_type})
+            except Exception as e:
+                logger.error(f"Task delegation failed: {e}")
+                results.append({"status": "error", "message": str(e)})
+
+        # Store all delegated tasks in a single transaction
+        if rows:
+            with self._task_flush_lock:
+                if not self._pending_tasks:
+                    self._tasks_pending.set()
+                self._pending_tasks.extend(rows)
+            try:
+                self._flush_tasks()
+            except RuntimeError:
+                # Already logged; the rows stay buffered and the flusher retries them
+                pass
+
+        for grpc_future in grpc_futures:
+            self._check_orchestrator_response(grpc_future)
+        return results
+
+    def predict_tasks_suitability(self, task_types: List[str]) -> List[Optional[str]]:
+        """Predict the best robot for each task type, running the model once for the whole list."""
+        self._predict_batch(task_types)
+        return [self.predict_task_suitability(t) for t in task_types]
+
+    def _predict_batch(self, task_types: List[str]) -> None:
+        """Predict every uncached, valid task type in one model call and fill the prediction cache."""
+        if not self.model or self._spec_table is not None:
+            return
+        missing = [t for t in dict.fromkeys(task_types)
+                   if t in self._task_idx and
+                   self._pred_cache.get(t, (None, None))[1] != self._cap_version]
+        if not missing:
+            return
+        try:
+            idxs = np.fromiter((self._task_idx[t] for t in missing), dtype=np.int64, count=len(missing))
+            best = self._predict(self._onehots[idxs])
+            for task_type, best_robot_idx in zip(missing, best):
+                self._pred_cache[task_type] = (self._robot_for_index(int(best_robot_idx)), self._cap_version)
+        except Exception as e:
+            # Leave the cache as is; predict_task_suitability retries per task
+            logger.warning(f"Batched task suitability prediction failed: {e}")
+
+    def _verify_assignment(self, task_type: str, robot_id: Optional[str]) -> None:
+        """Check that a predicted robot exists and has the capability for the task."""
+        if not robot_id:
+            raise RuntimeError(f"No suitable robot found for task {task_type}")
+        if robot_id not in self.capabilities:
+            raise RuntimeError(f"Robot {robot_id} not found in capabilities")
+        if task_type not in self.capabilities[robot_id]:
+            raise RuntimeError(f"Robot {robot_id} lacks capability for {task_type}")
+
+    def _send_to_orchestrator(self, task_type: str, robot_id: str):
+        """Start a DelegateTask call (if gRPC is available) and return its future."""
+        if not (self.grpc_stub and orchestrator_pb2):
+            return None
+        try:
+            request = orchestrator_pb2.TaskRequest(task_type=task_type, robot_id=robot_id)
+            return self.grpc_stub.DelegateTask.future(request, timeout=GRPC_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"gRPC task delegation failed: {e}. Continuing without gRPC.")
+            return None
+
+    def _check_orchestrator_response(self, grpc_future) -> None:
+        """Wait for a DelegateTask call and log a warning if it failed or was rejected."""
+        if grpc_future is None:
+            return
+        try:
+            response = grpc_future.result()
+            if not response.success:
+                raise RuntimeError(f"Orchestrator rejected task: {response.message}")
+        except Exception as e:
+            logger.warning(f"gRPC task delegation failed: {e}. Continuing without gRPC.")
+
+    def _publish_task(self, task_type: str, robot_id: str) -> None:
+        """Publish a task to the ROS topic (if available)."""
+        if not self.ros_pub:
+            return
+        try:
+            msg = self._ros_msg
+            with self._ros_msg_lock:
+                if self.typed_ros_msgs:
+                    msg.robot_id = robot_id
+                    msg.task_type = task_type
+                else:
+                    msg.data = self._ros_payload(robot_id, task_type)
+                self.ros_pub.publish(msg)
+            logger.info("Published task %s to robot %s", task_type, robot_id)
+        except Exception as e:
+            logger.warning(f"ROS publishing failed: {e}")
+
+    def get_task_status(self, task_id: int) -> Optional[Dict[str, object]]:
+        """Look up a task by ID, including tasks still waiting in the write buffer."""
+        self._flush_tasks()
+        try:
+            with self._reader() as conn:
+                row = conn.execute(
+                    "SELECT id, task_type, robot_id, status FROM tasks WHERE id = ?", (task_id,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to query task {task_id}: {e}")
+            raise RuntimeError(f"Database query failed: {e}")
+        if not row:
+            return None
+        return {
+            "id": row['id'],
+            "task_type": row['task_type'],
+            "robot_id": row['robot_id'],
+            "status": row['status']
+        }
+
+    def _flush_tasks(self, requeue: bool = True) -> None:
+        """Write all pending task rows to the database in a single transaction.
+
+        On failure the rows are put back at the front of the buffer for the next flush, unless
+        requeue is False.
+        """
+        with self._task_flush_lock:
+            batch = self._pending_tasks
+            if not batch:
+                return
+            self._pending_tasks = []
+            try:
+                self.db.execute("BEGIN IMMEDIATE")
+                try:
+                    self.db.executemany(
+                        "INSERT INTO tasks (task_type, robot_id, status) VALUES (?, ?, ?)",
+                        batch
+                    )
+                except sqlite3.Error:
+                    self.db.execute("ROLLBACK")
+                    raise
+                self.db.execute("COMMIT")
             except sqlite3.Error as e:
-                logger.error(f"Failed to store task: {e}")
+                logger.error(f"Failed to store {len(batch)} task(s): {e}")
+                if requeue:
+                    self._pending_tasks[:0] = batch
+                    self._tasks_pending.set()
                 raise RuntimeError(f"Database task storage failed: {e}")
 
-            return {"status": "success", "robot_id": robot_id, "task_type": task_type}
+    def close(self) -> None:
+        """Flush pending task rows and release the database connections and ROS node.
+
+        Reads started after close() raise RuntimeError.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        _open_delegators.discard(self)
+        self._flush_stop.set()
+        self._tasks_pending.set()
+        if self._flush_thread is not threading.current_thread():
+            self._flush_thread.join()
+        try:
+            # Last chance to store the rows; nothing is left to retry them
+            self._flush_tasks(requeue=False)
+        except RuntimeError:
+            pass
+        try:
+            self.db.close()
+            while self._readers is not None and not self._readers.empty():
+                self._readers.get_nowait().close()
+            if getattr(self, 'ros_node', None):
+                self.ros_node.destroy_node()
+                self.ros_node = None
+                self.ros_pub = None
+            # The gRPC channel is shared across delegators and lives for the process
         except Exception as e:
-            logger.error(f"Task delegation failed: {e}")
-            return {"status": "error", "message": str(e)}
+            logger.warning(f"Cleanup failed: {e}")
 
     def __del__(self):
         """Clean up resources."""
+        if getattr(self, '_closed', True):
+            return
         try:
-            if hasattr(self, 'db') and self.db:
-                self.db.close()
-            if hasattr(self, 'grpc_channel') and self.grpc_channel:
-                self.grpc_channel.close()
-        except Exception as e:
-            logger.warning(f"Cleanup failed: {e}")
+            self.close()
+        except Exception:
+            # Interpreter teardown may already have cleared module globals
+            pass
+
+class BatchingDelegator(TaskDelegator):
+    """Task delegator that micro-batches model inference across concurrent callers.
+
+    Pending predictions are queued and drained by background threads, which stack up to
+    ``max_batch_size`` one-hot inputs (or whatever arrives within ``batch_timeout_micros``)
+    into a single forward pass and hand each caller its result through a Future.
+    """
+
+    def __init__(self, model_path: str, db_path: str, grpc_endpoint: str, ros_topic: str,
+                 typed_ros_msgs: bool = False, max_batch_size: int = 32, batch_timeout_micros: int = 1000,
+                 num_batch_threads: int = 1):
+        """Initialize the delegator and start the batching threads."""
+        if max_batch_size < 1 or batch_timeout_micros < 0 or num_batch_threads < 1:
+            raise ValueError("Invalid batching configuration")
+        # Set before the model is compiled, which sizes its batch buckets from it
+        self.max_batch_size = max_batch_size
+        super().__init__(model_path, db_path, grpc_endpoint, ros_topic, typed_ros_msgs)
+        self.batch_timeout_micros = batch_timeout_micros
+        self.num_batch_threads = num_batch_threads
+        self._queue: "queue.Queue" = queue.Queue()
+        self._batch_threads: List[threading.Thread] = []
+        # A model specialized to a lookup table never reaches the batch queue
+        if self.model and self._spec_table is None:
+            for i in range(num_batch_threads):
+                thread = threading.Thread(target=self._batch_loop, name=f"mrtodp-batch-{i}", daemon=True)
+                thread.start()
+                self._batch_threads.append(thread)
+            logger.info(f"Started {num_batch_threads} batching thread(s) "
+                        f"(max_batch_size={max_batch_size}, batch_timeout_micros={batch_timeout_micros})")
+
+    def _max_predict_rows(self) -> int:
+        """Largest number of rows passed to the model in one call."""
+        return max(self.max_batch_size, super()._max_predict_rows())
+
+    def _predict_uncached(self, task_type: str) -> Optional[str]:
+        """Predict the best robot for a task, batching model calls with other pending requests."""
+        if not self._batch_threads or self._spec_table is not None:
+            return super()._predict_uncached(task_type)
+        idx = self._task_idx.get(task_type)
+        if idx is None:
+            raise ValueError(f"Invalid task type: {task_type}")
+
+        future: Future = Future()
+        self._queue.put((self._onehots[idx], future))
+        return self._robot_for_index(future.result())
+
+    def _batch_loop(self) -> None:
+        """Drain queued requests into batches and run one forward pass per batch."""
+        timeout = self.batch_timeout_micros / 1e6
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + timeout
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Re-queue the sentinel so shutdown still reaches this thread
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            futures = [f for _, f in batch]
+            try:
+                best = self._predict(np.stack([x for x, _ in batch]))
+                for future, idx in zip(futures, best):
+                    future.set_result(int(idx))
+            except Exception as e:
+                logger.error(f"Batched prediction failed: {e}")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def close(self) -> None:
+        """Stop the batching threads after pending requests are served, then close the delegator."""
+        threads = getattr(self, '_batch_threads', [])
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+        self._batch_threads = []
+        super().close()
 
 # Example usage
 if __name__ == "__main__":
     import sys
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     try:
         delegator = TaskDelegator(
             model_path=os.getenv("MODEL_PATH", ""),
@@ -6,11 +6,14 @@
 # production environment.
 
 import os
+import signal
+import threading
 from typing import Dict, Optional
 import click
 import json
 import logging
-from backend.python.ai_engine.delegator import TaskDelegator
+from backend.python.ai_engine.delegator import BatchingDelegator, TaskDelegator
+from backend.python.daemon import DEFAULT_SOCKET_PATH, DelegatorClient, DelegatorServer, delegator_config
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -32,25 +35,88 @@ CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
               help='gRPC endpoint for Orchestrator communication.')
 @click.option('--ros-topic', default='/mrtodp/tasks',
               help='ROS topic for task publishing.')
+@click.option('--typed-ros-msgs', is_flag=True, default=False,
+              help='Publish mrtodp_interfaces/Task messages instead of std_msgs/String JSON.')
+@click.option('--socket', 'socket_path', default=DEFAULT_SOCKET_PATH,
+              help='Unix socket of the delegator daemon started with `mrtodp serve`.')
 @click.pass_context
-def cli(ctx: click.Context, model_path: str, db_path: str, grpc_endpoint: str, ros_topic: str) -> None:
+def cli(ctx: click.Context, model_path: str, db_path: str, grpc_endpoint: str, ros_topic: str,
+        typed_ros_msgs: bool, socket_path: str) -> None:
     """Multi-Robot Task Orchestration and Delegation Platform (MRTODP) CLI.
 
     Manages task definition, robot assignment, and status monitoring for heterogeneous robots.
-    Interfaces with the AI-driven task delegator to optimize task allocation.
+    Interfaces with the AI-driven task delegator to optimize task allocation. Commands are
+    forwarded to a running `mrtodp serve` daemon when one is listening on --socket with the
+    same model, database, gRPC and ROS settings, and fall back to an in-process delegator
+    otherwise.
     """
+    delegator_kwargs = dict(
+        model_path=model_path or os.getenv("MODEL_PATH", ""),
+        db_path=db_path or os.getenv("DB_PATH", "mrtodp_tasks.db"),
+        grpc_endpoint=grpc_endpoint or os.getenv("GRPC_ENDPOINT", ""),
+        ros_topic=ros_topic or os.getenv("ROS_TOPIC", "/mrtodp/tasks"),
+        typed_ros_msgs=typed_ros_msgs
+    )
+    if ctx.invoked_subcommand == 'serve':
+        ctx.obj = {"delegator_kwargs": delegator_kwargs, "socket_path": socket_path}
+        return
+
+    client = DelegatorClient(socket_path)
+    daemon_config = client.config()
+    if daemon_config == delegator_config(**delegator_kwargs):
+        ctx.obj = client
+        logger.info(f"Using delegator daemon at {socket_path}")
+        return
+    if daemon_config is not None:
+        logger.warning(f"Delegator daemon at {socket_path} uses different settings; "
+                       "running an in-process delegator instead")
     try:
-        ctx.obj = TaskDelegator(
-            model_path=model_path or os.getenv("MODEL_PATH", ""),
-            db_path=db_path or os.getenv("DB_PATH", "mrtodp_tasks.db"),
-            grpc_endpoint=grpc_endpoint or os.getenv("GRPC_ENDPOINT", ""),
-            ros_topic=ros_topic or os.getenv("ROS_TOPIC", "/mrtodp/tasks")
-        )
+        ctx.obj = TaskDelegator(**delegator_kwargs)
         logger.info("Initialized TaskDelegator for CLI")
     except Exception as e:
         logger.error(f"Failed to initialize TaskDelegator: {e}")
         raise click.ClickException(f"Initialization failed: {e}")
 
+@cli.command()
+@click.option('--max-batch-size', default=32, show_default=True,
+              help='Maximum number of predictions per model call.')
+@click.option('--batch-timeout-micros', default=1000, show_default=True,
+              help='Maximum time to wait for a batch to fill.')
+@click.option('--num-batch-threads', default=1, show_default=True,
+              help='Number of threads running batched predictions.')
+@click.pass_context
+def serve(ctx: click.Context, max_batch_size: int, batch_timeout_micros: int,
+          num_batch_threads: int) -> None:
+    """Run a persistent delegator daemon for other CLI invocations.
+
+    Loads the model, gRPC channel, ROS node and database once and serves define, assign
+    and monitor requests from other `mrtodp` processes over a Unix socket.
+
+    Example: mrtodp serve --max-batch-size 64
+    """
+    try:
+        delegator = BatchingDelegator(
+            **ctx.obj["delegator_kwargs"],
+            max_batch_size=max_batch_size,
+            batch_timeout_micros=batch_timeout_micros,
+            num_batch_threads=num_batch_threads
+        )
+        server = DelegatorServer(delegator, ctx.obj["socket_path"])
+    except Exception as e:
+        logger.error(f"Failed to start delegator daemon: {e}")
+        raise click.ClickException(f"Daemon startup failed: {e}")
+    # shutdown() blocks until serve_forever returns, so it cannot run on the serving thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    click.echo(f"Serving delegator on {ctx.obj['socket_path']} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        # Flushes buffered task rows before exiting
+        delegator.close()
+
 @cli.command()
 @click.argument('task_type')
 @click.pass_context
@@ -91,9 +157,10 @@ def assign(ctx: click.Context, task_type: str, robot_id: str) -> None:
             raise ValueError("Task type and robot ID cannot be empty")
         delegator: TaskDelegator = ctx.obj
         # Validate robot capabilities
-        if robot_id not in delegator.capabilities:
+        capabilities = delegator.capabilities
+        if robot_id not in capabilities:
             raise ValueError(f"Robot {robot_id} not found in capabilities")
-        if task_type not in delegator.capabilities[robot_id]:
+        if task_type not in capabilities[robot_id]:
             raise ValueError(f"Robot {robot_id} lacks capability for {task_type}")
         
         # Delegate task (will use the specified robot if it matches prediction)
@@ -123,17 +190,9 @@ def monitor(ctx: click.Context, task_id: int) -> None:
             raise ValueError("Task ID must be a positive integer")
         delegator: TaskDelegator = ctx.obj
         # Query task status from SQLite
-        cursor = delegator.db.cursor()
-        cursor.execute("SELECT id, task_type, robot_id, status FROM tasks WHERE id = ?", (task_id,))
-        row = cursor.fetchone()
-        if not row:
+        result = delegator.get_task_status(task_id)
+        if not result:
             raise RuntimeError(f"Task ID {task_id} not found")
-        result = {
-            "id": row['id'],
-            "task_type": row['task_type'],
-            "robot_id": row['robot_id'],
-            "status": row['status']
-        }
         click.echo(json.dumps(result, indent=2))
         logger.info(f"Monitored task ID {task_id}: {result['status']}")
     except Exception as e:
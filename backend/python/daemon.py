@@ -0,0 +1,167 @@
+# backend/python/daemon.py
+# Purpose: Implements a long-lived delegation daemon for MRTODP and the thin client used by
+# backend/python/cli.py. The daemon keeps one TaskDelegator (TensorFlow model, gRPC channel,
+# ROS node, SQLite connection) warm and serves newline-delimited JSON requests over a local
+# Unix socket, so CLI invocations skip the cold start and concurrent callers share one
+# batching delegator. Includes error handling for malformed requests and unreachable daemons.
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from backend.python.ai_engine.delegator import TaskDelegator
+
+logger = logging.getLogger(__name__)
+
+# Default Unix socket path shared by `mrtodp serve` and the CLI client; prefers the per-user
+# runtime directory over the shared temp directory
+DEFAULT_SOCKET_PATH = os.getenv("MRTODP_SOCKET") or os.path.join(
+    os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir(), "mrtodp.sock"
+)
+
+def delegator_config(model_path: str, db_path: str, grpc_endpoint: str, ros_topic: str,
+                     typed_ros_msgs: bool = False) -> Dict[str, Any]:
+    """Normalized delegator settings, used to check that a daemon matches the caller's options."""
+    return {
+        "model_path": os.path.abspath(model_path) if model_path else "",
+        "db_path": os.path.abspath(db_path) if db_path and db_path != ":memory:" else db_path,
+        "grpc_endpoint": grpc_endpoint or "",
+        "ros_topic": ros_topic or "",
+        "typed_ros_msgs": typed_ros_msgs,
+    }
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Handle one JSON request per connection."""
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.dispatch(request)
+        except json.JSONDecodeError as e:
+            response = {"status": "error", "message": f"Invalid JSON request: {e}"}
+        except Exception as e:
+            logger.error(f"Request handling failed: {e}")
+            response = {"status": "error", "message": str(e)}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+class DelegatorServer(socketserver.ThreadingUnixStreamServer):
+    """Unix socket server exposing a TaskDelegator to CLI clients."""
+
+    daemon_threads = True
+
+    def __init__(self, delegator: TaskDelegator, socket_path: str = DEFAULT_SOCKET_PATH):
+        """Bind the server to socket_path, replacing a stale socket file if present.
+
+        Raises RuntimeError if another daemon is already answering on socket_path.
+        """
+        self.delegator = delegator
+        self.socket_path = socket_path
+        self.config = delegator_config(delegator.model_path, delegator.db_path,
+                                       delegator.grpc_endpoint, delegator.ros_topic,
+                                       delegator.typed_ros_msgs)
+        if os.path.exists(socket_path):
+            if DelegatorClient(socket_path).config() is not None:
+                raise RuntimeError(f"A delegator daemon is already listening on {socket_path}")
+            os.unlink(socket_path)
+        # Create the socket owner-only from the start rather than tightening it after bind
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+        logger.info(f"Delegator daemon listening on {socket_path}")
+
+    def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Route a decoded request to the delegator."""
+        op = request.get("op")
+        if op == "ping":
+            return {"status": "success", "config": self.config}
+        if op == "delegate":
+            return self.delegator.delegate_task(request.get("task_type", ""))
+        if op == "delegate_batch":
+            task_types = request.get("task_types")
+            if not isinstance(task_types, list) or not all(isinstance(t, str) for t in task_types):
+                return {"status": "error", "message": "task_types must be a list of strings"}
+            return {"status": "success", "results": self.delegator.delegate_tasks(task_types)}
+        if op == "capabilities":
+            return {"status": "success", "capabilities": self.delegator.capabilities}
+        if op == "task_status":
+            # A missing task is a successful lookup with no result; errors are reserved for failures
+            return {"status": "success", "task": self.delegator.get_task_status(int(request.get("task_id", 0)))}
+        return {"status": "error", "message": f"Unknown operation: {op}"}
+
+    def server_close(self) -> None:
+        """Close the listening socket and remove the socket file."""
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+class DelegatorClient:
+    """Client for a running delegator daemon, mirroring the TaskDelegator methods the CLI uses."""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 10.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _request(self, op: str, **kwargs: Any) -> Dict[str, Any]:
+        """Send one request to the daemon and return its decoded response."""
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+                with sock.makefile("rwb") as stream:
+                    stream.write(json.dumps({"op": op, **kwargs}).encode() + b"\n")
+                    stream.flush()
+                    return json.loads(stream.readline())
+        except (OSError, json.JSONDecodeError) as e:
+            raise RuntimeError(f"Delegator daemon request failed: {e}")
+
+    def config(self) -> Optional[Dict[str, Any]]:
+        """Return the settings of the daemon listening on the socket, or None if there is none.
+
+        A socket owned by another user is ignored, so requests never go to someone else's process.
+        """
+        try:
+            owner = os.stat(self.socket_path).st_uid
+        except OSError:
+            return None
+        if owner != os.getuid():
+            logger.warning(f"Ignoring delegator socket {self.socket_path} owned by uid {owner}")
+            return None
+        try:
+            response = self._request("ping")
+        except RuntimeError:
+            return None
+        if response.get("status") != "success":
+            return None
+        return response.get("config")
+
+    def delegate_task(self, task_type: str) -> Dict[str, str]:
+        """Delegate a task through the daemon."""
+        return self._request("delegate", task_type=task_type)
+
+    def delegate_tasks(self, task_types: List[str]) -> List[Dict[str, str]]:
+        """Delegate several tasks through the daemon in one request."""
+        response = self._request("delegate_batch", task_types=task_types)
+        if response.get("status") != "success":
+            raise RuntimeError(response.get("message", "Batch delegation failed"))
+        return response["results"]
+
+    @property
+    def capabilities(self) -> Dict[str, Dict[str, int]]:
+        """Robot capabilities as loaded by the daemon."""
+        response = self._request("capabilities")
+        if response.get("status") != "success":
+            raise RuntimeError(response.get("message", "Failed to fetch capabilities"))
+        return response["capabilities"]
+
+    def get_task_status(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """Look up a task by ID through the daemon."""
+        response = self._request("task_status", task_id=task_id)
+        if response.get("status") != "success":
+            raise RuntimeError(response.get("message", "Task status query failed"))
+        return response["task"]
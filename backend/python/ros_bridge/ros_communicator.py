@@ -2,70 +2,178 @@
 # Purpose: Implements a ROS 2 node for MRTODP to handle communication with heterogeneous robots.
 # Publishes tasks to robots via the /mrtodp/tasks topic and subscribes to status updates on
 # /mrtodp/responses. Interfaces with backend/cpp/robot_interface/interface.cpp for task execution
-# and supports robot-specific languages (KRL, RAPID, KAREL, VAL3) via JSON payloads.
+# and supports robot-specific languages (KRL, RAPID, KAREL, VAL3) via JSON or msgpack payloads.
 # Uses Python 3.10 with ROS 2 (Humble) and includes robust error handling for ROS connection
 # failures, ensuring reliable communication in a production environment.
 
+import dataclasses
+import functools
+import json
+import logging
 import os
-from typing import Dict, Optional
+import signal
+import threading
+from array import array
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+# Module logger; handlers and levels are configured by main() or the embedding application
+logger = logging.getLogger(__name__)
+
 try:
     import rclpy
+    from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
+    from rclpy.executors import MultiThreadedExecutor
     from rclpy.node import Node
+    from rclpy.logging import LoggingSeverity
     from rclpy.qos import QoSProfile, ReliabilityPolicy, HistoryPolicy
-    from std_msgs.msg import String
+    from std_msgs.msg import String, UInt8MultiArray
     ROS_AVAILABLE = True
 except ImportError:
     ROS_AVAILABLE = False
     logger.warning("ROS 2 not available. Install with: sudo apt install ros-humble-ros-base")
 
-import json
-import logging
+def _to_builtin(obj):
+    """Convert values the encoders cannot handle natively (NumPy arrays/scalars, dataclasses)."""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
 
-# Configure logging for debugging and error tracking
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+try:
+    import orjson
+    # Bound once at module level so the hot path skips the attribute lookup. NumPy arrays
+    # in task_data are serialized natively, without a .tolist() copy; non-string keys are
+    # stringified as json.dumps does
+    _dumps = functools.partial(
+        orjson.dumps, default=_to_builtin,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    )
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), default=_to_builtin).encode()
+    _loads = json.loads
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+if ROS_AVAILABLE:
+    # Default QoS, built once at import: reliable delivery for task commands and
+    # latest-only, best-effort delivery for status updates
+    _TASK_QOS = QoSProfile(
+        reliability=ReliabilityPolicy.RELIABLE,
+        history=HistoryPolicy.KEEP_LAST,
+        depth=10
+    )
+    _STATUS_QOS = QoSProfile(
+        reliability=ReliabilityPolicy.BEST_EFFORT,
+        history=HistoryPolicy.KEEP_LAST,
+        depth=1
+    )
+
+# Stand-in for task_data when building per-(robot, task type) payload templates
+_PARAMS_PLACEHOLDER = "__MRTODP_PARAMS__"
+# Maximum cached templates per robot; further task types are formatted without caching
+_MAX_TEMPLATES = 64
+
+# Command wrapper per robot language (extend for KAREL, VAL3)
+_COMMAND_FORMATS = {
+    "KRL": "KRL_EXEC({})",
+    "RAPID": "RAPID_EXEC({})",
+}
 
 class RosCommunicator(Node if ROS_AVAILABLE else object):
     """ROS 2 node for communicating with robots in MRTODP."""
 
-    def __init__(self, task_topic: str = "/mrtodp/tasks", response_topic: str = "/mrtodp/responses"):
-        """Initialize the ROS 2 node with task and response topics."""
+    # Log every published task at INFO; set MRTODP_PUBLISH_VERBOSE=0 to drop it from the hot path
+    PUBLISH_VERBOSE = os.environ.get("MRTODP_PUBLISH_VERBOSE", "1") != "0"
+
+    def __init__(self, task_topic: str = "/mrtodp/tasks", response_topic: str = "/mrtodp/responses",
+                 task_qos: Optional["QoSProfile"] = None, status_qos: Optional["QoSProfile"] = None,
+                 coalesce_period: Optional[float] = None, wire_format: str = "json"):
+        """Initialize the ROS 2 node with task and response topics.
+
+        task_qos defaults to RELIABLE/KEEP_LAST(10) so commands are not lost; status_qos
+        defaults to BEST_EFFORT/KEEP_LAST(1) since status updates are superseded by the next
+        one. Pass either to override for a given deployment.
+
+        If coalesce_period (seconds) is set, publish_task queues payloads and a timer publishes
+        everything queued as one array message per period (a JSON array, or a msgpack array
+        with wire_format="msgpack"); subscribers on task_topic must then accept arrays of task
+        payloads.
+
+        wire_format selects the task payload encoding: "json" (std_msgs/String) or "msgpack"
+        (std_msgs/UInt8MultiArray), which keeps numeric task_data binary on the wire.
+        """
+        if wire_format == "json":
+            self._encode = _dumps
+        elif wire_format == "msgpack":
+            if msgpack is None:
+                raise RuntimeError("wire_format='msgpack' requires the msgpack package")
+            self._encode = functools.partial(msgpack.packb, use_bin_type=True, default=_to_builtin)
+        else:
+            raise ValueError(f"Unsupported wire format: {wire_format}")
+        self.wire_format = wire_format
+        # Bound per instance so the hot paths do an attribute load instead of a global lookup
+        self._loads = _loads
+
         if not ROS_AVAILABLE:
             logger.warning("ROS 2 not available. RosCommunicator will operate in mock mode.")
             self.task_publisher = None
             self.response_subscriber = None
+            self._outbox = None
             self.robot_language_map = {
                 "Ford": "KRL",
                 "Scion": "RAPID",
             }
+            self._build_formatters()
+            self._start_inbox()
             return
 
         super().__init__('ros_communicator')
+        self._log = self.get_logger()
+        self._start_inbox()
 
-        # Define QoS profile for reliable communication
-        qos = QoSProfile(
-            reliability=ReliabilityPolicy.RELIABLE,
-            history=HistoryPolicy.KEEP_LAST,
-            depth=10
-        )
+        # Separate groups so timer-driven publishes never queue behind response handling
+        self._response_cb_group = MutuallyExclusiveCallbackGroup()
+        self._timer_cb_group = MutuallyExclusiveCallbackGroup()
 
-        # Initialize task publisher
-        try:
-            self.task_publisher = self.create_publisher(String, task_topic, qos)
-            self.get_logger().info(f"Initialized publisher on topic {task_topic}")
-        except Exception as e:
-            logger.error(f"Failed to create publisher for {task_topic}: {e}")
-            raise RuntimeError(f"Publisher initialization failed: {e}")
+        if task_qos is None:
+            task_qos = _TASK_QOS
+        if status_qos is None:
+            status_qos = _STATUS_QOS
 
-        # Initialize response subscriber
+        # Initialize task publisher and response subscriber
+        task_msg_type = UInt8MultiArray if wire_format == "msgpack" else String
+        topic = task_topic
         try:
+            self.task_publisher = self.create_publisher(task_msg_type, task_topic, task_qos)
+            topic = response_topic
             self.response_subscriber = self.create_subscription(
-                String, response_topic, self.response_callback, qos
+                String, response_topic, self.response_callback, status_qos,
+                callback_group=self._response_cb_group
             )
-            self.get_logger().info(f"Initialized subscriber on topic {response_topic}")
         except Exception as e:
-            logger.error(f"Failed to create subscriber for {response_topic}: {e}")
-            raise RuntimeError(f"Subscriber initialization failed: {e}")
+            logger.error(f"Failed to create publisher/subscriber for {topic}: {e}")
+            raise RuntimeError(f"ROS endpoint initialization failed for {topic}: {e}")
+        self._log.info(f"Initialized publisher on topic {task_topic} and subscriber on topic {response_topic}")
+
+        # Reused for every publish; the publisher copies .data out at publish time. The lock
+        # keeps concurrent callers on the MultiThreadedExecutor from overwriting each other
+        self._task_msg = task_msg_type()
+        self._task_msg_lock = threading.Lock()
+
+        # Optional outbound coalescing: queued payloads are flushed as one array per period
+        self._outbox = None
+        if coalesce_period:
+            self._outbox = []
+            self._outbox_lock = threading.Lock()
+            self._flush_timer = self.create_timer(
+                coalesce_period, self._flush_outbox, callback_group=self._timer_cb_group
+            )
 
         # Robot language mappings (extend as needed)
         self.robot_language_map = {
@@ -73,82 +181,168 @@ class RosCommunicator(Node if ROS_AVAILABLE else object):
             "Scion": "RAPID", # ABB RAPID
             # Add KAREL, VAL3 mappings for other robots
         }
+        self._build_formatters()
 
     def publish_task(self, robot_id: str, task_type: str, task_data: Dict) -> bool:
-        """Publish a task to a robot with language-specific formatting."""
-        try:
-            # Validate inputs
-            if not robot_id or not task_type:
-                raise ValueError("robot_id and task_type cannot be empty")
-            if robot_id not in self.robot_language_map:
-                raise ValueError(f"Unknown robot: {robot_id}")
-
-            # Format task data for robot-specific language
-            language = self.robot_language_map[robot_id]
-            formatted_data = self._format_task_data(task_type, task_data, language)
-
-            # Create JSON payload
-            payload = {
-                "robot_id": robot_id,
-                "task_type": task_type,
-                "task_data": formatted_data,
-                "language": language
-            }
+        """Publish a task to a robot with language-specific formatting.
 
-            # Publish task to ROS topic
-            if self.task_publisher:
-                msg = String()
-                msg.data = json.dumps(payload)
-                self.task_publisher.publish(msg)
-                self.get_logger().info(f"Published task {task_type} to robot {robot_id} in {language}")
-            else:
-                logger.info(f"[MOCK] Would publish task {task_type} to robot {robot_id} in {language}")
-            return True
-        except Exception as e:
-            if ROS_AVAILABLE:
-                self.get_logger().error(f"Failed to publish task to {robot_id}: {e}")
-            logger.error(f"Task publishing failed: {e}")
+        Returns False for an empty or unknown robot/task or if the publish itself fails.
+        task_data that cannot be serialized raises TypeError.
+        """
+        # Validate inputs
+        format_payload = self._formatter_for.get(robot_id)
+        if format_payload is None or not task_type:
+            logger.error(f"Task publishing failed: invalid robot_id {robot_id!r} or task_type {task_type!r}")
             return False
+        payload = format_payload(task_type, task_data)
+
+        # Publish task to ROS topic
+        if self._outbox is not None:
+            with self._outbox_lock:
+                self._outbox.append(payload)
+        elif self.task_publisher:
+            msg = self._task_msg
+            data = self._msg_data(payload)
+            try:
+                with self._task_msg_lock:
+                    msg.data = data
+                    self.task_publisher.publish(msg)
+            except Exception as e:
+                self._log.error(f"Failed to publish task to {robot_id}: {e}")
+                logger.error(f"Task publishing failed: {e}")
+                return False
+            # rclpy loggers take a preformatted string, so only build it if it will be emitted
+            if self.PUBLISH_VERBOSE and self._log.is_enabled_for(LoggingSeverity.INFO):
+                self._log.info(f"Published task {task_type} to robot {robot_id} "
+                               f"in {self.robot_language_map[robot_id]}")
+        else:
+            logger.info("[MOCK] Would publish task %s to robot %s in %s",
+                        task_type, robot_id, self.robot_language_map[robot_id])
+        return True
 
-    def _format_task_data(self, task_type: str, task_data: Dict, language: str) -> Dict:
-        """Format task data for robot-specific language."""
+    def _msg_data(self, payload: bytes):
+        """Convert an encoded payload to the task message's data field type."""
+        if self.wire_format == "msgpack":
+            return array('B', payload)
+        return payload.decode()
+
+    def _flush_outbox(self) -> None:
+        """Publish all queued task payloads as a single array message in the configured wire format."""
+        with self._outbox_lock:
+            if not self._outbox:
+                return
+            batch, self._outbox = self._outbox, []
+        msg = self._task_msg
+        if self.wire_format == "msgpack":
+            data = self._msg_data(msgpack.Packer().pack_array_header(len(batch)) + b"".join(batch))
+        else:
+            data = self._msg_data(b"[" + b",".join(batch) + b"]")
         try:
-            # Example formatting for robot languages (extend for KAREL, VAL3)
-            if language == "KRL":
-                return {"command": f"KRL_EXEC({task_type})", "params": task_data}
-            elif language == "RAPID":
-                return {"command": f"RAPID_EXEC({task_type})", "params": task_data}
-            else:
-                raise ValueError(f"Unsupported robot language: {language}")
+            with self._task_msg_lock:
+                msg.data = data
+                self.task_publisher.publish(msg)
         except Exception as e:
-            logger.error(f"Task data formatting failed for {language}: {e}")
-            raise RuntimeError(f"Task formatting failed: {e}")
+            self._log.error(f"Failed to publish {len(batch)} coalesced task(s): {e}")
+            logger.error(f"Coalesced task publishing failed: {e}")
+
+    def _build_formatters(self) -> None:
+        """Build the robot_id -> payload formatter dispatch table from robot_language_map."""
+        self._formatter_for = {}
+        for robot_id, language in self.robot_language_map.items():
+            command_format = _COMMAND_FORMATS.get(language)
+            if command_format is None:
+                logger.warning(f"Unsupported robot language {language} for {robot_id}; robot disabled")
+                continue
+            self._formatter_for[robot_id] = self._make_formatter(robot_id, language, command_format, self._encode)
+
+    @staticmethod
+    def _make_formatter(robot_id: str, language: str, command_format: str, encode):
+        """Return a closure serializing a task payload for one robot.
+
+        Everything except task_data is fixed per task type, so it is serialized once into a
+        (prefix, suffix) pair around a placeholder and later calls only encode task_data. Up to
+        _MAX_TEMPLATES task types are cached per robot.
+        """
+        templates: Dict[str, Tuple[bytes, bytes]] = {}
+
+        def format_payload(task_type: str, task_data: Dict) -> bytes:
+            template = templates.get(task_type)
+            if template is None:
+                payload = {
+                    "robot_id": robot_id,
+                    "task_type": task_type,
+                    "task_data": {"command": command_format.format(task_type), "params": _PARAMS_PLACEHOLDER},
+                    "language": language
+                }
+                # params is the last field that varies, so split on the last match in case
+                # task_type itself contains the placeholder
+                template = tuple(encode(payload).rsplit(encode(_PARAMS_PLACEHOLDER), 1))
+                if len(templates) < _MAX_TEMPLATES:
+                    templates[task_type] = template
+            return template[0] + encode(task_data) + template[1]
+
+        return format_payload
 
-    def response_callback(self, msg: String) -> None:
+    def _start_inbox(self) -> None:
+        """Start the worker thread that parses status updates queued by response_callback."""
+        # Bounded so a stalled worker drops the oldest status updates instead of growing forever
+        self._inbox = deque(maxlen=1024)
+        self._inbox_ready = threading.Event()
+        self._inbox_stop = threading.Event()
+        self._inbox_thread = threading.Thread(target=self._drain_inbox, name="mrtodp-responses", daemon=True)
+        self._inbox_thread.start()
+
+    def response_callback(self, msg: "String") -> None:
+        """Queue a status update from a robot; parsing happens off the executor thread."""
+        self._inbox.append(msg.data)
+        self._inbox_ready.set()
+
+    def _drain_inbox(self) -> None:
+        """Process queued status updates until shutdown."""
+        while not self._inbox_stop.is_set():
+            self._inbox_ready.wait()
+            self._inbox_ready.clear()
+            while self._inbox:
+                self._handle_response(self._inbox.popleft())
+
+    def _handle_response(self, raw: str) -> None:
         """Handle status updates from robots."""
+        # Status updates are JSON objects; reject truncated or corrupted payloads without
+        # paying for the parser's error path. Leading whitespace is only stripped on the
+        # uncommon path, so objects the parser accepts are never rejected here
+        if raw[:1] != "{" and raw.lstrip()[:1] != "{":
+            if ROS_AVAILABLE:
+                self._log.error("Invalid JSON in response: payload is not a JSON object")
+            logger.error("Invalid JSON in response: payload is not a JSON object")
+            return
         try:
-            data = json.loads(msg.data)
+            data = self._loads(raw)
             robot_id = data.get("robot_id", "unknown")
             status = data.get("status", "unknown")
             if ROS_AVAILABLE:
-                self.get_logger().info(f"Received status from {robot_id}: {status}")
+                self._log.info(f"Received status from {robot_id}: {status}")
             else:
                 logger.info(f"Received status from {robot_id}: {status}")
         except json.JSONDecodeError as e:
             if ROS_AVAILABLE:
-                self.get_logger().error(f"Invalid JSON in response: {e}")
+                self._log.error(f"Invalid JSON in response: {e}")
             logger.error(f"Invalid JSON in response: {e}")
         except Exception as e:
             if ROS_AVAILABLE:
-                self.get_logger().error(f"Response processing failed: {e}")
+                self._log.error(f"Response processing failed: {e}")
             logger.error(f"Response processing failed: {e}")
 
     def shutdown(self) -> None:
         """Clean up ROS node resources."""
         try:
+            self._inbox_stop.set()
+            self._inbox_ready.set()
+            self._inbox_thread.join(timeout=1.0)
             if ROS_AVAILABLE:
+                if self._outbox is not None:
+                    self._flush_outbox()
+                self._log.info("ROS communicator node shut down")
                 self.destroy_node()
-                self.get_logger().info("ROS communicator node shut down")
             else:
                 logger.info("ROS communicator shut down (mock mode)")
         except Exception as e:
@@ -156,21 +350,33 @@ class RosCommunicator(Node if ROS_AVAILABLE else object):
 
 def main():
     """Initialize and run the ROS communicator node."""
+    # Configure logging only if the host process has not; relativeCreated avoids a
+    # strftime per record
+    if not logging.getLogger().handlers:
+        # getLevelName maps known names to their number and anything else to a string
+        level = logging.getLevelName(os.environ.get("MRTODP_LOG", "WARNING").upper())
+        logging.basicConfig(
+            level=level if isinstance(level, int) else logging.WARNING,
+            format='%(relativeCreated)d ms - %(levelname)s - %(message)s'
+        )
     try:
         if ROS_AVAILABLE:
             # Initialize ROS 2
             rclpy.init()
             communicator = RosCommunicator()
 
-            # Spin node to process callbacks
-            rclpy.spin(communicator)
+            # Spin node to process callbacks; one thread per callback group
+            executor = MultiThreadedExecutor(num_threads=2)
+            executor.add_node(communicator)
+            executor.spin()
         else:
             logger.warning("ROS 2 not available. Running in mock mode.")
             communicator = RosCommunicator()
-            # Keep running
-            import time
-            while True:
-                time.sleep(1)
+            # Block without waking up until SIGINT/SIGTERM
+            stop = threading.Event()
+            signal.signal(signal.SIGINT, lambda *_: stop.set())
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            stop.wait()
     except Exception as e:
         logger.error(f"ROS communicator failed: {e}")
     finally: